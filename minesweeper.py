@@ -1,5 +1,9 @@
+import collections
 import itertools
 import random
+import sys
+
+import numpy as np
 
 
 class Minesweeper():
@@ -8,23 +12,23 @@ class Minesweeper():
 
         self.height = height
         self.width = width
-        self.mines = set()
 
         # Initialize an empty field with no mines
-        self.board = []
-        for i in range(self.height):
-            row = []
-            for j in range(self.width):
-                row.append(False)
-            self.board.append(row)
+        self.board = np.zeros((height, width), dtype=bool)
 
         # Add mines randomly
-        while len(self.mines) != mines:
-            i = random.randrange(height)
-            j = random.randrange(width)
-            if not self.board[i][j]:
-                self.mines.add((i, j))
-                self.board[i][j] = True
+        positions = random.sample(range(height * width), mines)
+        self.board.flat[positions] = True
+        self.mines = {divmod(p, width) for p in positions}
+
+        # Mines never move, so count every cell's neighbours up front
+        # by summing the eight shifted copies of the padded board
+        pad = np.pad(self.board.astype(np.int8), 1)
+        self._counts = (
+            pad[0:-2, 0:-2] + pad[0:-2, 1:-1] + pad[0:-2, 2:]
+            + pad[1:-1, 0:-2] + pad[1:-1, 2:]
+            + pad[2:, 0:-2] + pad[2:, 1:-1] + pad[2:, 2:]
+        )
 
         # At first, player has found no mines
         self.mines_found = set()
@@ -34,19 +38,17 @@ class Minesweeper():
         Prints a text-based representation
         of where mines are located.
         """
-        for i in range(self.height):
-            print("--" * self.width + "-")
-            for j in range(self.width):
-                if self.board[i][j]:
-                    print("|X", end="")
-                else:
-                    print("| ", end="")
-            print("|")
-        print("--" * self.width + "-")
+        border = "--" * self.width + "-"
+        cells = np.where(self.board, "|X", "| ")
+        lines = []
+        for row in cells:
+            lines.append(border)
+            lines.append("".join(row) + "|")
+        lines.append(border)
+        sys.stdout.write("\n".join(lines) + "\n")
 
     def is_mine(self, cell):
-        i, j = cell
-        return self.board[i][j]
+        return bool(self.board[cell])
 
     def nearby_mines(self, cell):
         """
@@ -54,55 +56,105 @@ class Minesweeper():
         within one row and column of a given cell,
         not including the cell itself.
         """
+        return int(self._counts[cell])
 
-        count = 0
+    def won(self):
+        return self.mines_found == self.mines
 
-        # Loop over all cells within one row and column
-        for i in range(cell[0] - 1, cell[0] + 2):
-            for j in range(cell[1] - 1, cell[1] + 2):
 
-                # Ignore the cell itself
-                if (i, j) == cell:
-                    continue
+def popcount(mask):
+    """
+    Returns the number of cells set in a cell bitmask.
+    """
+    return bin(mask).count("1")
+
 
-                # Update count if cell in bounds and is mine
-                if 0 <= i < self.height and 0 <= j < self.width:
-                    if self.board[i][j]:
-                        count += 1
+def bits_to_cells(mask, width):
+    """
+    Yields the (i, j) cells whose bits are set in a cell bitmask.
+    """
+    while mask:
+        lsb = mask & -mask
+        yield divmod(lsb.bit_length() - 1, width)
+        mask ^= lsb
 
-        return count
 
-    def won(self):
-        return self.mines_found == self.mines
+def neighbor_mask(i, j, height, width):
+    """
+    Returns the bitmask of the cells within one row and column
+    of (i, j), not including the cell itself.
+    """
+    mask = 0
+    for a in range(max(0, i - 1), min(height, i + 2)):
+        for b in range(max(0, j - 1), min(width, j + 2)):
+            if (a, b) != (i, j):
+                mask |= 1 << (a * width + b)
+    return mask
+
+
+def subset_reductions(masks, sizes, counts):
+    """
+    Returns the (i, j) index pairs where sentence i is a strict subset
+    of sentence j, given parallel lists of cell masks, mask sizes and
+    mine counts sorted by mask size.
+    """
+    n = len(masks)
+    pairs = []
+    for i in range(n):
+        mask_s, size_s, count_s = masks[i], sizes[i], counts[i]
+        for j in range(i + 1, n):
+            if size_s >= sizes[j] or count_s > counts[j]:
+                continue
+            if mask_s & masks[j] == mask_s:
+                pairs.append((i, j))
+    return pairs
 
 
 class Sentence():
     """
     A sentence consists of a set of board cells,
     and a count of the number of those cells which are mines.
+
+    Cells are stored as an int bitmask where bit i * width + j
+    stands for (i, j).
     """
 
-    def __init__(self, cells, count):
-        self.cells = set(cells)
+    def __init__(self, cells, count, width=8):
+        self.width = width
+        if isinstance(cells, int):
+            self.cells = cells
+        else:
+            self.cells = 0
+            for (i, j) in cells:
+                self.cells |= 1 << (i * width + j)
         self.count = count
 
+        # Cached number of cells, kept in step with the mask
+        self._len = popcount(self.cells)
+
+        # Set instead of removing the sentence from the knowledge list
+        self._dead = False
+
     def __eq__(self, other):
-        return self.cells == other.cells and self.count == other.count
+        return self is other
+
+    def __hash__(self):
+        return id(self)
 
     def __str__(self):
-        return f"{self.cells} = {self.count}"
+        return f"{set(bits_to_cells(self.cells, self.width))} = {self.count}"
 
     def known_mines(self):
         """
-        Returns the set of all cells in self.cells known to be mines.
+        Returns the mask of all cells in self.cells known to be mines.
         """
-        if len(self.cells) == self.count:
+        if self._len == self.count:
             return self.cells
         return None
 
     def known_safes(self):
         """
-        Returns the set of all cells in self.cells known to be safe.
+        Returns the mask of all cells in self.cells known to be safe.
         """
         if self.count == 0:
             return self.cells
@@ -111,19 +163,30 @@ class Sentence():
     def mark_mine(self, cell):
         """
         Updates internal knowledge representation given the fact that
-        a cell is known to be a mine.
+        a cell is known to be a mine. Returns whether the sentence changed.
         """
-        if cell in self.cells:
-            self.cells.remove(cell)
+        i, j = cell
+        bit = 1 << (i * self.width + j)
+        if self.cells & bit:
+            self.cells ^= bit
+            self._len -= 1
             self.count -= 1
+            return True
+        return False
 
     def mark_safe(self, cell):
         """
         Marks a cell as safe, and updates all knowledge
         to mark that cell as safe as well.
+        Returns whether the sentence changed.
         """
-        if cell in self.cells:
-            self.cells.remove(cell)
+        i, j = cell
+        bit = 1 << (i * self.width + j)
+        if self.cells & bit:
+            self.cells ^= bit
+            self._len -= 1
+            return True
+        return False
 
 
 class MinesweeperAI():
@@ -131,7 +194,7 @@ class MinesweeperAI():
     Minesweeper game player
     """
 
-    def __init__(self, height=8, width=8):
+    def __init__(self, height=8, width=8, verbose=False):
 
         # Set initial height and width
         self.height = height
@@ -144,114 +207,214 @@ class MinesweeperAI():
         self.mines = set()
         self.safes = set()
 
+        # Bitmask mirrors of the three sets above, for bulk set algebra
+        self._moves_mask = 0
+        self._mines_mask = 0
+        self._safes_mask = 0
+
+        # Known safe cells that have not been played yet
+        self._unplayed_safes = set()
+
+        # Cells that are neither played nor known mines
+        self._candidates = {(i, j) for i in range(height) for j in range(width)}
+
         # List of sentences about the game known to be true
         self.knowledge = []
 
+        # Neighbour mask of every cell, indexed by i * width + j
+        self._neighbors = self._neighbor_masks()
+
+        # Pending ("safe" | "mine", cell) inferences not yet propagated
+        self._work = collections.deque()
+
+        # Whether to dump the knowledge base and random moves to stdout
+        self._verbose = verbose
+
     def mark_mine(self, cell):
         """
         Marks a cell as a mine, and updates all knowledge
         to mark that cell as a mine as well.
         """
-        self.mines.add(cell)
-        for sentence in self.knowledge:
-            sentence.mark_mine(cell)
+        self._work.append(("mine", cell))
+        self._propagate()
 
     def mark_safe(self, cell):
         """
         Marks a cell as safe, and updates all knowledge
         to mark that cell as safe as well.
         """
-        self.safes.add(cell)
-        for sentence in self.knowledge:
-            sentence.mark_safe(cell)
-
-    def sentence(self, cell):
-        cells = set()
-        for i in range(cell[0] - 1, cell[0] + 2):
-            for j in range(cell[1] - 1, cell[1] + 2):
+        self._work.append(("safe", cell))
+        self._propagate()
 
-                if (i, j) == cell:
+    def _propagate(self):
+        """
+        Applies every pending inference to the knowledge base, queueing
+        the cells of any sentence that becomes fully resolved on the way.
+        Each cell is processed only once, and only the sentences that
+        contained it are checked again.
+        """
+        while self._work:
+            kind, cell = self._work.popleft()
+            bit = 1 << (cell[0] * self.width + cell[1])
+            if kind == "mine":
+                if self._mines_mask & bit:
+                    continue
+                self._mines_mask |= bit
+                self.mines.add(cell)
+                self._candidates.discard(cell)
+                for sentence in self.knowledge:
+                    if sentence._dead:
+                        continue
+                    if sentence.mark_mine(cell):
+                        self.check(sentence)
+            else:
+                if self._safes_mask & bit:
                     continue
+                self._safes_mask |= bit
+                self.safes.add(cell)
+                if not self._moves_mask & bit:
+                    self._unplayed_safes.add(cell)
+                for sentence in self.knowledge:
+                    if sentence._dead:
+                        continue
+                    if sentence.mark_safe(cell):
+                        self.check(sentence)
+
+    def _neighbor_masks(self):
+        return tuple(
+            neighbor_mask(i, j, self.height, self.width)
+            for i in range(self.height) for j in range(self.width)
+        )
 
-                # Update count if cell in bounds and is mine
-                if 0 <= i < self.height and 0 <= j < self.width:
-                    cells.add((i, j))
-        return cells
+    def sentence(self, cell):
+        """
+        Returns the set of cells neighbouring a cell. Kept for callers
+        outside the AI only; the AI itself works on the cached masks.
+        """
+        i, j = cell
+        return set(bits_to_cells(self._neighbors[i * self.width + j],
+                                 self.width))
 
     def check(self, sentence):
+        """
+        Queues the cells of a sentence that are known to be safe or mines.
+        A fully resolved sentence carries no further information, so it
+        is retired once its cells are queued.
+        """
         if sentence is None:
             return
         safe = sentence.known_safes()
         if safe is not None:
-            safe_2 = safe.copy()
-            for i in safe_2:
-                self.mark_safe(i)
+            for i in bits_to_cells(safe, self.width):
+                self._work.append(("safe", i))
+            sentence._dead = True
+            return
         mines = sentence.known_mines()
         if mines is not None:
-            mines_2 = mines.copy()
-            for i in mines_2:
-                self.mark_mine(i)
+            for i in bits_to_cells(mines, self.width):
+                self._work.append(("mine", i))
+            sentence._dead = True
 
     def add_knowledge(self, cell, count):
         """
         Called when the Minesweeper board tells us, for a given
         safe cell, how many neighboring cells have mines in them.
         """
-        self.moves_made.add(cell)
-        self.safes.add(cell)
-        cell_set = self.sentence(cell)
+        self._enqueue(cell, count)
+        self._reduce()
 
-        cell_collection = cell_set.copy()
-        for i in cell_collection:
+    def add_knowledge_batch(self, updates):
+        """
+        Same as add_knowledge for several (cell, count) pairs at once,
+        e.g. a revealed region, running the inference pass only once.
+        """
+        for cell, count in updates:
+            self._enqueue(cell, count)
+        self._reduce()
 
-            if i in self.safes:
-                cell_set.discard(i)
-            elif i in self.mines:
-                cell_set.discard(i)
-                count -= 1
-        sentence = Sentence(cell_set, count)
+    def _enqueue(self, cell, count):
+        """
+        Records a move and adds the sentence about its neighbours,
+        queueing whatever it resolves without propagating it yet.
+        """
+        i, j = cell
+        self.moves_made.add(cell)
+        self._moves_mask |= 1 << (i * self.width + j)
+        self._unplayed_safes.discard(cell)
+        self._candidates.discard(cell)
+        self._work.append(("safe", cell))
+
+        # Drop neighbours that are already resolved
+        cell_mask = self._neighbors[i * self.width + j] & ~self._safes_mask
+        known_mines = cell_mask & self._mines_mask
+        cell_mask ^= known_mines
+        count -= popcount(known_mines)
+        sentence = Sentence(cell_mask, count, self.width)
 
+        self.knowledge.append(sentence)
         self.check(sentence)
 
-        self.knowledge.append(sentence)
-        for safe_cell in self.safes:
-            self.mark_safe(safe_cell)
-        for mine_cell in self.mines:
-            self.mark_mine(mine_cell)
-
-        copy_knowledge = self.knowledge.copy()
-        for sent in copy_knowledge:
-            cpy_sent = sent.cells.copy()
-            if sent.count == 0:
-                for c in cpy_sent:
-                    self.safes.add(c)
-                    sent.mark_safe(c)
-            elif len(sent.cells) == sent.count:
-                for c in cpy_sent:
-                    self.mines.add(c)
-                    sent.mark_mine(c)
-            if len(sent.cells) == 0:
-                self.knowledge.remove(sent)
-        copy_knowledge = self.knowledge.copy()
-
-        for set_o in copy_knowledge:
-            for set_s in copy_knowledge:
-                if set_o == set_s:
+    def _reduce(self):
+        """
+        Propagates pending inferences, then derives new sentences from
+        every pair where one sentence is a subset of another, repeating
+        until a pass derives nothing new.
+        """
+        self._propagate()
+        derived = True
+        while derived:
+            derived = False
+            copy_knowledge = [
+                sent for sent in self.knowledge if not sent._dead
+            ]
+
+            # Smallest sentences first: a subset can only precede its superset
+            copy_knowledge.sort(key=lambda sent: sent._len)
+            pairs = subset_reductions(
+                [sent.cells for sent in copy_knowledge],
+                [sent._len for sent in copy_knowledge],
+                [sent.count for sent in copy_knowledge],
+            )
+
+            # (cells, count) of every live sentence, to skip duplicates
+            live = {(sent.cells, sent.count) for sent in copy_knowledge}
+            for i, j in pairs:
+                set_s, set_o = copy_knowledge[i], copy_knowledge[j]
+
+                # Propagation may have changed either sentence since the scan
+                if set_s._dead or set_o._dead \
+                        or set_s._len >= set_o._len \
+                        or (set_s.cells & set_o.cells) != set_s.cells:
                     continue
 
-                elif set_s.cells < set_o.cells:
-                    new_set = set_o.cells - set_s.cells
-                    new_count = set_o.count - set_s.count
-                    new_sentence = Sentence(new_set, new_count)
-                    if set_s in self.knowledge:
-                        self.knowledge.remove(set_s)
-                    self.knowledge.append(new_sentence)
-                    self.check(new_sentence)
+                # The superset is implied by the subset and the difference,
+                # so replacing it keeps every sentence shrinking
+                new_set = set_o.cells & ~set_s.cells
+                new_count = set_o.count - set_s.count
+                set_o._dead = True
+                live.discard((set_o.cells, set_o.count))
+                derived = True
+                # Skip duplicates, or every copy keeps spawning new ones
+                if (new_set, new_count) in live:
+                    continue
+                new_sentence = Sentence(new_set, new_count, self.width)
+                self.knowledge.append(new_sentence)
+                live.add((new_set, new_count))
+                self.check(new_sentence)
+
+                # Propagation rewrites sentences in place, so refresh the keys
+                if self._work:
+                    self._propagate()
+                    live = {(sent.cells, sent.count)
+                            for sent in self.knowledge if not sent._dead}
+
+        self.knowledge = [sent for sent in self.knowledge if not sent._dead]
 
-        for i in self.knowledge:
-            print(i)
-        print()
-        print(self.mines)
+        if self._verbose:
+            for i in self.knowledge:
+                print(i)
+            print()
+            print(self.mines)
 
 
     def make_safe_move(self):
@@ -260,25 +423,43 @@ class MinesweeperAI():
         The move must be known to be safe, and not already a move
         that has been made.
         """
-        for move in self.safes:
-            if move not in self.moves_made:
-                return move
-        return None
+        return next(iter(self._unplayed_safes), None)
 
     def make_random_move(self):
         """
         Returns a move to make on the Minesweeper board.
         """
-        pos_moves = []
-        for i in range(self.height):
-            for j in range(self.width):
-                move = (i, j)
-                if move not in self.mines and move not in self.moves_made:
-                    pos_moves.append(move)
-        if len(pos_moves) != 0:
-            move = random.choice(pos_moves)
+        if not self._candidates:
+            return None
+        move = random.choice(tuple(self._candidates))
+        if self._verbose:
             print(move)
-            return move
-        return None
+        return move
+
+
+# Neighbour masks for the default 8x8 board, indexed by i * 8 + j
+NEIGHBOR_MASKS_8x8 = tuple(
+    neighbor_mask(i, j, 8, 8) for i in range(8) for j in range(8)
+)
 
 
+class MinesweeperAI8x8(MinesweeperAI):
+    """
+    Minesweeper game player for the default 8x8 board, sharing one
+    precomputed neighbour table between games.
+    """
+
+    def __init__(self, verbose=False):
+        super().__init__(height=8, width=8, verbose=verbose)
+
+    def _neighbor_masks(self):
+        return NEIGHBOR_MASKS_8x8
+
+
+def make_ai(height=8, width=8, verbose=False):
+    """
+    Returns the AI player best suited to a board of the given size.
+    """
+    if (height, width) == (8, 8):
+        return MinesweeperAI8x8(verbose=verbose)
+    return MinesweeperAI(height=height, width=width, verbose=verbose)